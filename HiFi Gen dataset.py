@@ -1,14 +1,45 @@
 import os
+import io
+import re
 import sys
-import json
+import mmap
+import hashlib
+import asyncio
 import subprocess
+import functools
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import librosa
-import random
+import orjson
+import scipy.fft
+from scipy.io import wavfile
+
+try:
+    import torch
+    import torchaudio
+except ImportError:
+    torch = None
+    torchaudio = None
+
+try:
+    import webdataset as wds
+except ImportError:
+    wds = None
+
+try:
+    import pyfftw
+    import pyfftw.interfaces.scipy_fft
+except ImportError:
+    pyfftw = None
 
 # to run this files first open cmd and run
-# pip install numpy pandas librosa youtube_transcript_api yt-dlp
+# pip install numpy pandas scipy librosa orjson youtube_transcript_api yt-dlp
+# optionally run "pip install torch torchaudio" to extract Mel-spectrograms with torchaudio
+# and "pip install webdataset" to write the dataset as tar shards (see WRITE_SHARDS)
+# and "pip install pyfftw" to run librosa's FFTs through FFTW when torchaudio is not installed
 
 # ==================== Configuration ====================
 
@@ -28,7 +59,35 @@ os.makedirs(AUDIO_OUTPUT_DIR, exist_ok=True)
 os.makedirs(MEL_OUTPUT_DIR, exist_ok=True)
 
 # Supported audio formats
-SUPPORTED_AUDIO_FORMATS = ['.mp3', '.wav', '.flac', '.m4a', '.aac']
+SUPPORTED_AUDIO_FORMATS = frozenset({'.mp3', '.wav', '.flac', '.m4a', '.aac'})
+
+# Write (wav, mel, text) samples into WebDataset tar shards instead of one .wav and one .npy per segment.
+# In this mode metadata.csv lists "sample_key|shard_path" rows instead of mel/audio file paths;
+# the sample keys are the names written to training.txt and validation.txt.
+WRITE_SHARDS = False
+SHARD_PATTERN = os.path.join(OUTPUT_DIR, "shard-%06d.tar")
+SHARD_MAXCOUNT = 1000
+
+# Sampling rate of the sliced WAV clips and their Mel-spectrograms
+SAMPLE_RATE = 16000
+
+# Data type of the saved Mel-spectrograms. float16 halves disk size and loading
+# bandwidth; HiFi-GAN readers should promote to float32 (mel.astype(np.float32)).
+MEL_DTYPE = np.float16
+
+# Number of worker processes used to extract and save Mel-spectrograms
+MAX_WORKERS = os.cpu_count() or 1
+
+# Segments in flight at once (decoding in ffmpeg or waiting on / running in a worker).
+# Twice the pool size lets the next ffmpeg decodes overlap with Mel extraction.
+MAX_CONCURRENT_SEGMENTS = 2 * MAX_WORKERS
+
+# FFTW wisdom (saved FFT plans) reused across runs when pyfftw is installed
+FFTW_WISDOM_PATH = "fftw_wisdom.bin"
+
+# Threads per ffmpeg invocation. ffmpeg defaults to min(cpu_count, 16) threads,
+# which oversubscribes the CPU when many ffmpeg processes run at once.
+FFMPEG_THREADS = max(1, (os.cpu_count() or 1) // MAX_WORKERS)
 
 # ==================== Helper Functions ====================
 
@@ -42,81 +101,102 @@ def create_training_and_validation_files(csv_path,
         path_to_mel|path_to_audio
     For example:
         hifi_gan_dataset/mel/speaker_8_segment_262.npy|hifi_gan_dataset/audio/speaker_8_segment_262.wav
+    or, when WRITE_SHARDS is enabled:
+        speaker_8_segment_262|hifi_gan_dataset/shard-000000.tar
 
     Then splits the file names (without extensions) into training and validation files.
     The train/val split ratio is by default 90% / 10%.
+
+    Each name is assigned by a hash of the name itself, so the split is
+    reproducible across runs and the CSV is streamed line by line.
     """
     
-    # Read all lines from the CSV
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        lines = f.read().strip().split('\n')
-    
-    # Extract the base names without extensions
-    data = []
-    for line in lines:
-        # Split by the '|' delimiter
-        left_path, right_path = line.split('|')
-        
-        # The left_path (e.g. "hifi_gan_dataset/mel/speaker_8_segment_262.npy")
-        # We'll only extract one name (both left and right refer to the same file base).
-        filename = left_path.split('/')[-1]  # "speaker_8_segment_262.npy"
-        base_name = filename.split('.')[0]   # "speaker_8_segment_262"
-        
-        data.append(base_name)
-    
-    # Shuffle data for a more random split
-    random.shuffle(data)
-    
-    # Determine split index
-    split_index = int(len(data) * train_ratio)
-    
-    # Split into training and validation
-    training_data = data[:split_index]
-    validation_data = data[split_index:]
-    
-    # Write training data to file
-    with open(training_output, 'w', encoding='utf-8') as train_file:
-        for item in training_data:
-            train_file.write(f"{item}\n")
-    
-    # Write validation data to file
-    with open(validation_output, 'w', encoding='utf-8') as val_file:
-        for item in validation_data:
-            val_file.write(f"{item}\n")
-
-
-def convert_and_slice_audio(ffmpeg_path, input_audio_path, start_time, duration, output_wav_path):
+    with open(csv_path, 'r', encoding='utf-8', buffering=1 << 20) as f, \
+            open(training_output, 'w', encoding='utf-8', buffering=1 << 20) as train_file, \
+            open(validation_output, 'w', encoding='utf-8', buffering=1 << 20) as val_file:
+        for line in f:
+            # Skip blank lines and header comments such as "# mel_dtype=float16"
+            if not line.strip() or line.startswith('#'):
+                continue
+            
+            # Extract the base name without extension from the left (mel) path,
+            # e.g. "hifi_gan_dataset/mel/speaker_8_segment_262.npy" -> "speaker_8_segment_262".
+            # Both left and right paths refer to the same file base.
+            base_name = os.path.splitext(os.path.basename(line.partition('|')[0]))[0]
+            
+            # Map the name to [0, 1) with blake2b; names below train_ratio go to training
+            digest = hashlib.blake2b(base_name.encode('utf-8'), digest_size=4).digest()
+            if int.from_bytes(digest, 'big') / 2 ** 32 < train_ratio:
+                train_file.write(f"{base_name}\n")
+            else:
+                val_file.write(f"{base_name}\n")
+
+
+async def decode_to_numpy(ffmpeg_path, input_path, start, duration, sr=SAMPLE_RATE, threads=FFMPEG_THREADS):
     """
-    Converts and slices the audio segment using ffmpeg.
+    Decodes and slices an audio segment with ffmpeg, piping mono float32 PCM
+    straight into memory instead of writing an intermediate WAV file.
+    The PCM is read in chunks as ffmpeg produces it, so many segments can be
+    decoded concurrently from a single event loop.
 
     Args:
         ffmpeg_path (str): Path to the ffmpeg executable.
-        input_audio_path (str): Path to the input audio file.
-        start_time (float): Start time in seconds.
+        input_path (str): Path to the input audio file.
+        start (float): Start time in seconds.
         duration (float): Duration in seconds.
-        output_wav_path (str): Path to save the output sliced WAV file.
+        sr (int): Sampling rate to resample the segment to.
+        threads (int): Number of threads ffmpeg may use for decoding.
+
+    Returns:
+        np.ndarray: Decoded samples as float32 in the range [-1, 1].
     """
     command = [
         ffmpeg_path,
-        "-y",                # Overwrite output files without asking
-        "-ss", str(start_time),  # Start time
+        "-v", "quiet",           # Only the PCM data goes to stdout
+        "-threads", str(threads),  # Limit decoding threads
+        "-ss", str(start),       # Start time
         "-t", str(duration),     # Duration
-        "-i", input_audio_path,  # Input file
-        "-ar", "22050",          # Set audio sampling rate to 16kHz
+        "-i", input_path,        # Input file
+        "-f", "f32le",           # Raw 32-bit float little endian PCM
+        "-ar", str(sr),          # Set audio sampling rate
         "-ac", "1",              # Set number of audio channels to mono
-        "-acodec", "pcm_s16le",  # Set audio codec to PCM 16-bit little endian
-        "-af", "volume=1.0",     # Apply volume leveling (simple normalization)
-        output_wav_path          # Output file
+        "pipe:1"                 # Write to stdout
     ]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    buffer = bytearray()
     try:
-        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-    except subprocess.CalledProcessError as e:
+        while chunk := await process.stdout.read(65536):
+            buffer.extend(chunk)
+        returncode = await process.wait()
+    finally:
+        # On cancellation (e.g. Ctrl-C or an error elsewhere in asyncio.run) don't leave ffmpeg running
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if returncode != 0:
+        e = subprocess.CalledProcessError(returncode, command)
         print(f"Error during ffmpeg processing: {e}")
         raise e
+    return np.frombuffer(buffer, dtype=np.float32)
+
+def save_wav(wav_path, y, sr=SAMPLE_RATE):
+    """
+    Saves float32 samples as a 16-bit PCM WAV file.
+
+    Args:
+        wav_path (str or file-like): Path or buffer to save the WAV file to.
+        y (np.ndarray): Samples in the range [-1, 1].
+        sr (int): Sampling rate of the samples.
+    """
+    pcm = (np.clip(y, -1.0, 1.0) * 32767).astype(np.int16)
+    wavfile.write(wav_path, sr, pcm)
 
 def load_json(json_path):
     """
-    Loads and parses a JSON file.
+    Loads and parses a JSON file. The file is memory-mapped and parsed by
+    orjson directly from the mapped bytes, without an intermediate copy.
 
     Args:
         json_path (str): Path to the JSON file.
@@ -124,33 +204,177 @@ def load_json(json_path):
     Returns:
         list: Parsed JSON data.
     """
-    with open(json_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(json_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            # The view must be released before the map is closed
+            with memoryview(m) as view:
+                return orjson.loads(view)
+
+@functools.lru_cache(maxsize=None)
+def _get_mel_transform(sr, n_fft, n_mels, hop_length, win_length):
+    """
+    Builds the torchaudio Mel-spectrogram transforms once per process so the
+    filterbank and window are reused across segments.
+
+    The transforms stay on the CPU: this runs in every pool worker, and one
+    CUDA context per worker would quickly exhaust GPU memory.
 
-def extract_mel_spectrogram(wav_path, n_mels=80, hop_length=256, win_length=1024):
+    Returns:
+        tuple: (MelSpectrogram, AmplitudeToDB)
+    """
+    # Parameters mirror librosa.feature.melspectrogram so both backends produce the same output
+    mel_transform = torchaudio.transforms.MelSpectrogram(
+        sample_rate=sr,
+        n_fft=n_fft,
+        win_length=win_length,
+        hop_length=hop_length,
+        n_mels=n_mels,
+        power=1.0,
+        pad_mode="constant",
+        norm="slaney",
+        mel_scale="slaney"
+    )
+    to_db = torchaudio.transforms.AmplitudeToDB(stype="power", top_db=80)
+    return mel_transform, to_db
+
+def _read_fftw_wisdom():
     """
-    Extracts Mel-spectrogram from a WAV file.
+    Reads FFTW wisdom saved by _write_fftw_wisdom. The file holds plain byte
+    arrays and is loaded without pickle, so it cannot run code on import.
+
+    Returns:
+        tuple: Wisdom bytes as returned by pyfftw.export_wisdom.
+    """
+    with np.load(FFTW_WISDOM_PATH, allow_pickle=False) as data:
+        return tuple(data[f"arr_{i}"].tobytes() for i in range(len(data.files)))
+
+def _write_fftw_wisdom():
+    """
+    Writes the wisdom of this process to FFTW_WISDOM_PATH as one uint8 array per precision.
+    """
+    with open(FFTW_WISDOM_PATH, 'wb') as f:
+        np.savez(f, *(np.frombuffer(wisdom, dtype=np.uint8) for wisdom in pyfftw.export_wisdom()))
+
+def _setup_fftw():
+    """
+    Routes librosa's FFTs through pyfftw with plan caching and loads saved FFTW wisdom.
+    Runs on import, so every worker process is set up the same way.
+    """
+    pyfftw.interfaces.cache.enable()
+    pyfftw.interfaces.cache.set_keepalive_time(60)
+    if os.path.isfile(FFTW_WISDOM_PATH):
+        try:
+            pyfftw.import_wisdom(_read_fftw_wisdom())
+        except Exception as e:
+            print(f"Error loading FFTW wisdom {FFTW_WISDOM_PATH}: {e}")
+    # librosa computes its FFTs with scipy.fft (librosa.set_fftlib is deprecated)
+    scipy.fft.set_global_backend(pyfftw.interfaces.scipy_fft)
+
+# librosa's FFTs are only used when torchaudio is not installed
+if pyfftw is not None and torchaudio is None:
+    _setup_fftw()
+
+def _save_fftw_wisdom(lock):
+    """
+    Merges the FFTW wisdom gathered by this process into FFTW_WISDOM_PATH.
+
+    Args:
+        lock (multiprocessing.Lock): Serializes the read-merge-write between workers.
+    """
+    with lock:
+        # Keep what other workers already saved
+        if os.path.isfile(FFTW_WISDOM_PATH):
+            try:
+                pyfftw.import_wisdom(_read_fftw_wisdom())
+            except Exception as e:
+                print(f"Error loading FFTW wisdom {FFTW_WISDOM_PATH}: {e}")
+        try:
+            _write_fftw_wisdom()
+        except Exception as e:
+            print(f"Error saving FFTW wisdom {FFTW_WISDOM_PATH}: {e}")
+
+def _init_worker(wisdom_lock):
+    """
+    Initializer of the ProcessPoolExecutor workers. Torch is limited to one
+    thread per worker, and when librosa's FFTs run through pyfftw, the wisdom
+    a worker collects while planning the real STFT transforms is saved when
+    the pool shuts the worker down.
 
     Args:
-        wav_path (str): Path to the WAV file.
+        wisdom_lock (multiprocessing.Lock): Shared lock passed on to _save_fftw_wisdom.
+    """
+    if torch is not None:
+        # Every pool worker already runs on its own core
+        torch.set_num_threads(1)
+    if pyfftw is not None and torchaudio is None:
+        multiprocessing.util.Finalize(None, _save_fftw_wisdom, args=(wisdom_lock,), exitpriority=0)
+
+@functools.lru_cache(maxsize=None)
+def _get_mel_filterbank(sr, n_fft, n_mels):
+    """
+    Builds the librosa Mel filterbank once per process and reuses it across segments.
+
+    Returns:
+        np.ndarray: Filterbank of shape (n_mels, 1 + n_fft // 2).
+    """
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).astype(np.float32)
+
+def extract_mel_spectrogram(y, sr=SAMPLE_RATE, n_mels=80, hop_length=256, win_length=1024, n_fft=2048):
+    """
+    Extracts Mel-spectrogram from decoded audio samples or a WAV file.
+    Uses torchaudio when it is installed, otherwise librosa.
+
+    Args:
+        y (np.ndarray or str): Mono audio samples, or path to a WAV file.
+        sr (int): Sampling rate of the samples.
         n_mels (int): Number of Mel bands to generate.
         hop_length (int): Number of samples between successive frames.
         win_length (int): Each frame of audio is windowed by `window` of length `win_length`.
+        n_fft (int): Length of the FFT window.
 
     Returns:
-        np.ndarray: Mel-spectrogram in decibels.
+        np.ndarray: Mel-spectrogram in decibels, stored as MEL_DTYPE.
     """
-    y, sr = librosa.load(wav_path, sr=16000)
-    mel = librosa.feature.melspectrogram(
-        y=y,
-        sr=sr,
-        n_mels=n_mels,
+    if isinstance(y, str):
+        y, sr = librosa.load(y, sr=sr)
+
+    if torchaudio is not None:
+        mel_transform, to_db = _get_mel_transform(sr, n_fft, n_mels, hop_length, win_length)
+        with torch.no_grad():
+            mel = to_db(mel_transform(torch.tensor(y)))
+            mel = mel - mel.max()  # Same as ref=np.max in librosa.power_to_db
+        return np.ascontiguousarray(mel.numpy(), dtype=MEL_DTYPE)
+
+    # Same as librosa.feature.melspectrogram(power=1.0), but with a cached filterbank
+    spec = np.abs(librosa.stft(
+        y,
+        n_fft=n_fft,
         hop_length=hop_length,
         win_length=win_length,
-        power=1.0  # Use power=1.0 for energy
-    )
+        window='hann'
+    )).astype(np.float32)  # Use power=1.0 for energy
+    mel = _get_mel_filterbank(sr, n_fft, n_mels) @ spec
     mel = librosa.power_to_db(mel, ref=np.max)
-    return mel.astype(np.float32)
+    # C-contiguous MEL_DTYPE so the saved .npy can be memory-mapped by load_mel
+    return np.ascontiguousarray(mel, dtype=MEL_DTYPE)
+
+def load_mel(mel_path):
+    """
+    Loads a saved Mel-spectrogram as a read-only memory map, so only the frames
+    that are actually accessed are read from disk.
+
+    Args:
+        mel_path (str): Path to the .npy file.
+
+    Returns:
+        np.memmap: Mel-spectrogram of shape (n_mels, frames) with dtype MEL_DTYPE.
+        Cast with .astype(np.float32) where full precision is needed.
+    """
+    return np.load(mel_path, mmap_mode='r')
+
+# Anything that is not alphanumeric, '_' or '-'. \w matches the same characters
+# as str.isalnum() plus '_', so non-Latin (e.g. Bengali) letters are kept.
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^\w-]')
 
 def sanitize_filename(filename):
     """
@@ -162,124 +386,244 @@ def sanitize_filename(filename):
     Returns:
         str: Sanitized filename.
     """
-    return "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in filename)
+    return _UNSAFE_FILENAME_CHARS.sub('_', filename)
 
-# ==================== Main Processing ====================
+def _process_segment(args):
+    """
+    Saves a decoded segment as WAV, then extracts and saves its Mel-spectrogram.
+    Runs inside a worker process of the ProcessPoolExecutor.
 
-def main():
-    # Verify ffmpeg path
-    if not os.path.isfile(FFMPEG_PATH):
-        print(f"FFmpeg not found at specified path: {FFMPEG_PATH}")
-        sys.exit(1)
+    When WRITE_SHARDS is disabled the WAV and the Mel-spectrogram are saved to
+    their own files. Otherwise both are serialized and returned so the main
+    process can append them to the current shard.
 
-    metadata_entries = []
+    Args:
+        args (tuple): (y, segment_audio_path, mel_path, metadata_entry)
 
-    # List all audio files in the input directory
-    audio_files = [
-        file for file in os.listdir(AUDIO_INPUT_DIR)
-        if os.path.splitext(file)[1].lower() in SUPPORTED_AUDIO_FORMATS
-    ]
+    Returns:
+        tuple: (metadata_entry, sample) where sample holds the "wav" and "mel.npy"
+        bytes when WRITE_SHARDS is enabled and is None otherwise.
+        None if the segment failed.
+    """
+    y, segment_audio_path, mel_path, metadata_entry = args
 
-    total_audio_files = len(audio_files)
-    if total_audio_files == 0:
-        print(f"No supported audio files found in {AUDIO_INPUT_DIR}. Exiting.")
-        return
+    # Write the WAV from the decoded buffer
+    try:
+        wav_target = io.BytesIO() if WRITE_SHARDS else segment_audio_path
+        save_wav(wav_target, y)
+    except Exception as e:
+        print(f"\nError processing segment {segment_audio_path}: {e}")
+        return None
 
-    for audio_idx, audio_file in enumerate(audio_files, start=1):
-        file_ext = os.path.splitext(audio_file)[1].lower()
-        base_name = os.path.splitext(audio_file)[0]
-        json_filename = base_name + ".json"
+    # Extract Mel-spectrogram
+    try:
+        mel = extract_mel_spectrogram(y)
+    except Exception as e:
+        print(f"\nError extracting Mel-spectrogram for {segment_audio_path}: {e}")
+        return None
+
+    # Save Mel-spectrogram
+    try:
+        mel_target = io.BytesIO() if WRITE_SHARDS else mel_path
+        np.save(mel_target, mel, allow_pickle=False)
+    except Exception as e:
+        print(f"\nError saving Mel-spectrogram {mel_path}: {e}")
+        return None
 
-        audio_path = os.path.join(AUDIO_INPUT_DIR, audio_file)
-        json_path = os.path.join(JSON_INPUT_DIR, json_filename)
+    if WRITE_SHARDS:
+        return metadata_entry, {"wav": wav_target.getvalue(), "mel.npy": mel_target.getvalue()}
+    return metadata_entry, None
+
+async def _process_segment_async(executor, semaphore, audio_path, job):
+    """
+    Decodes one segment with ffmpeg and hands the samples to the worker pool.
+
+    Args:
+        executor (ProcessPoolExecutor): Pool running _process_segment.
+        semaphore (asyncio.Semaphore): Limits the number of segments in flight.
+        audio_path (str): Path to the input audio file.
+        job (tuple): (start, duration, segment_audio_path, mel_path, metadata_entry, segment_key, text)
 
-        if not os.path.exists(json_path):
-            print(f"JSON file not found for {audio_file}, skipping.")
-            continue
+    Returns:
+        tuple: (job, result) where result is the return value of _process_segment.
+    """
+    start, duration, segment_audio_path, mel_path, metadata_entry, _, _ = job
 
-        # Extract speaker label from filename (assuming format: speaker_1_audio_001)
-        speaker_label_parts = base_name.split('_')
-        if len(speaker_label_parts) >= 2:
-            speaker_label = f"{speaker_label_parts[0]}_{speaker_label_parts[1]}"
-        else:
-            speaker_label = speaker_label_parts[0]
+    async with semaphore:
+        # Decode and slice audio using ffmpeg
+        try:
+            y = await decode_to_numpy(
+                ffmpeg_path=FFMPEG_PATH,
+                input_path=audio_path,
+                start=start,
+                duration=duration
+            )
+        except Exception as e:
+            print(f"\nError processing segment {segment_audio_path}: {e}")
+            return job, None
 
-        # Load JSON data
+        # Extract Mel-spectrogram in a worker process while other segments keep decoding
+        loop = asyncio.get_running_loop()
         try:
-            json_data = load_json(json_path)
+            result = await loop.run_in_executor(
+                executor, _process_segment, (y, segment_audio_path, mel_path, metadata_entry)
+            )
         except Exception as e:
-            print(f"Error loading JSON file {json_filename}: {e}")
-            continue
+            print(f"\nError processing segment {segment_audio_path}: {e}")
+            result = None
 
-        total_entries = len(json_data)
-        if total_entries == 0:
-            print(f"No segments found in {json_filename}, skipping.")
-            continue
+    return job, result
 
-        print(f"\nProcessing '{audio_file}' ({audio_idx}/{total_audio_files}) with {total_entries} segments.")
+async def _process_audio_segments(executor, audio_path, jobs, sink, meta_file, progress_label):
+    """
+    Processes all segments of one audio file. ffmpeg decoding runs as concurrent
+    subprocesses driven by the event loop, overlapping with Mel extraction in
+    the worker pool.
 
-        for idx, segment in enumerate(json_data, start=1):
-            text = segment.get("text", "").strip()
-            start = segment.get("start", 0.0)
-            duration = segment.get("duration", 0.0)
+    Args:
+        executor (ProcessPoolExecutor): Pool running _process_segment.
+        audio_path (str): Path to the input audio file.
+        jobs (list): Segment jobs, see _process_segment_async.
+        sink (webdataset.ShardWriter): Shard writer, or None when WRITE_SHARDS is disabled.
+        meta_file (file): Open metadata file, the entry of each finished segment is written to it.
+        progress_label (str): Prefix for the progress line.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SEGMENTS)
+    tasks = [_process_segment_async(executor, semaphore, audio_path, job) for job in jobs]
 
-            if duration <= 0:
-                print(f"\nInvalid duration for segment {idx} in {json_filename}, skipping.")
-                continue
+    total_jobs = len(tasks)
+    for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+        job, result = await task
 
-            # Generate unique filenames
-            sanitized_base = sanitize_filename(base_name)
-            segment_filename = f"{sanitized_base}_segment_{idx:03d}.wav"
-            segment_audio_path = os.path.join(AUDIO_OUTPUT_DIR, segment_filename)
+        if result is not None:
+            metadata_entry, sample = result
 
-            # Convert and slice audio using ffmpeg
-            try:
-                convert_and_slice_audio(
-                    ffmpeg_path=FFMPEG_PATH,
-                    input_audio_path=audio_path,
-                    start_time=start,
-                    duration=duration,
-                    output_wav_path=segment_audio_path
-                )
-            except Exception as e:
-                print(f"\nError processing segment {idx} of {audio_file}: {e}")
-                continue
+            # Append the sample to the current shard; no per-segment files exist,
+            # so the metadata row points at the sample key inside its shard
+            if sample is not None:
+                _, _, _, _, _, segment_key, text = job
+                sample["__key__"] = segment_key
+                sample["txt"] = text
+                sink.write(sample)
+                metadata_entry = f"{segment_key}|{sink.fname.replace(os.sep, '/')}"
 
-            # Extract Mel-spectrogram
-            try:
-                mel = extract_mel_spectrogram(segment_audio_path)
-            except Exception as e:
-                print(f"\nError extracting Mel-spectrogram for {segment_filename}: {e}")
-                continue
+            # Add entry to metadata
+            meta_file.write(f"{metadata_entry}\n")
 
-            # Save Mel-spectrogram
-            mel_filename = f"{sanitized_base}_segment_{idx:03d}.npy"
-            mel_path = os.path.join(MEL_OUTPUT_DIR, mel_filename)
-            try:
-                np.save(mel_path, mel)
-            except Exception as e:
-                print(f"\nError saving Mel-spectrogram {mel_filename}: {e}")
-                continue
+        # Calculate progress
+        progress_percentage = (done / total_jobs) * 100
+        sys.stdout.write(f"\rProcessing {progress_label}: "
+                         f"Progress: {progress_percentage:.2f}% | Creating clip {done}/{total_jobs}")
+        sys.stdout.flush()
 
-            # Add entry to metadata
-            mel_relative = os.path.relpath(mel_path, OUTPUT_DIR)
-            audio_relative = os.path.relpath(segment_audio_path, OUTPUT_DIR)
-            metadata_entry = f"hifi_gan_dataset/mel/{mel_filename}|hifi_gan_dataset/audio/{segment_filename}"
-            metadata_entries.append(metadata_entry)
+# ==================== Main Processing ====================
+
+def main():
+    # Verify ffmpeg path
+    if not os.path.isfile(FFMPEG_PATH):
+        print(f"FFmpeg not found at specified path: {FFMPEG_PATH}")
+        sys.exit(1)
 
-            # Calculate progress
-            progress_percentage = (idx / total_entries) * 100
-            sys.stdout.write(f"\rProcessing {audio_file} -> {speaker_label}: "
-                             f"Progress: {progress_percentage:.2f}% | Creating clip {idx}/{total_entries}")
-            sys.stdout.flush()
+    if WRITE_SHARDS and wds is None:
+        print("WRITE_SHARDS is enabled but webdataset is not installed. Run: pip install webdataset")
+        sys.exit(1)
+
+    # List all audio files in the input directory
+    with os.scandir(AUDIO_INPUT_DIR) as entries:
+        audio_files = [
+            entry.name for entry in entries
+            if entry.is_file() and entry.name[entry.name.rfind('.'):].lower() in SUPPORTED_AUDIO_FORMATS
+        ]
+
+    total_audio_files = len(audio_files)
+    if total_audio_files == 0:
+        print(f"No supported audio files found in {AUDIO_INPUT_DIR}. Exiting.")
+        return
 
-        print()  # Move to the next line after processing all segments of the current audio file
+    # Shards are written from the main process only
+    sink = wds.ShardWriter(SHARD_PATTERN, maxcount=SHARD_MAXCOUNT) if WRITE_SHARDS else None
+
+    # Metadata entries are written as segments finish instead of being kept in memory.
+    # They go to a temporary file that replaces metadata.csv once all audio files are done.
+    metadata_tmp_path = METADATA_PATH + ".tmp"
+    with open(metadata_tmp_path, 'w', encoding='utf-8', buffering=1 << 20) as meta_file:
+        # Header so readers know which dtype to promote the Mel-spectrograms from
+        meta_file.write(f"# mel_dtype={np.dtype(MEL_DTYPE).name}\n")
+
+        # Segments are independent: ffmpeg decodes them concurrently and the Mel-spectrograms
+        # are extracted in a pool of worker processes.
+        # The outer per-audio-file loop stays sequential to keep JSON loading cheap.
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=_init_worker,
+                                 initargs=(multiprocessing.Lock(),)) as executor:
+            for audio_idx, audio_file in enumerate(audio_files, start=1):
+                base_name, _ = os.path.splitext(audio_file)
+                json_filename = base_name + ".json"
+
+                audio_path = os.path.join(AUDIO_INPUT_DIR, audio_file)
+                json_path = os.path.join(JSON_INPUT_DIR, json_filename)
+
+                if not os.path.exists(json_path):
+                    print(f"JSON file not found for {audio_file}, skipping.")
+                    continue
+
+                # Extract speaker label from filename (assuming format: speaker_1_audio_001)
+                speaker_label_parts = base_name.split('_')
+                if len(speaker_label_parts) >= 2:
+                    speaker_label = f"{speaker_label_parts[0]}_{speaker_label_parts[1]}"
+                else:
+                    speaker_label = speaker_label_parts[0]
+
+                # Load JSON data
+                try:
+                    json_data = load_json(json_path)
+                except Exception as e:
+                    print(f"Error loading JSON file {json_filename}: {e}")
+                    continue
+
+                total_entries = len(json_data)
+                if total_entries == 0:
+                    print(f"No segments found in {json_filename}, skipping.")
+                    continue
+
+                print(f"\nProcessing '{audio_file}' ({audio_idx}/{total_audio_files}) with {total_entries} segments.")
+
+                # Constant for every segment of this audio file
+                sanitized_base = sanitize_filename(base_name)
+                segment_prefix = f"{sanitized_base}_segment_"
+
+                jobs = []
+                for idx, segment in enumerate(json_data, start=1):
+                    text = segment.get("text", "").strip()
+                    start = segment.get("start", 0.0)
+                    duration = segment.get("duration", 0.0)
+
+                    if duration <= 0:
+                        print(f"\nInvalid duration for segment {idx} in {json_filename}, skipping.")
+                        continue
+
+                    # Generate unique filenames
+                    segment_key = f"{segment_prefix}{idx:03d}"
+                    segment_filename = f"{segment_key}.wav"
+                    segment_audio_path = os.path.join(AUDIO_OUTPUT_DIR, segment_filename)
+                    mel_filename = f"{segment_key}.npy"
+                    mel_path = os.path.join(MEL_OUTPUT_DIR, mel_filename)
+                    metadata_entry = f"hifi_gan_dataset/mel/{mel_filename}|hifi_gan_dataset/audio/{segment_filename}"
+
+                    jobs.append((start, duration, segment_audio_path, mel_path, metadata_entry, segment_key, text))
+
+                asyncio.run(_process_audio_segments(
+                    executor, audio_path, jobs, sink, meta_file, f"{audio_file} -> {speaker_label}"
+                ))
+
+                print()  # Move to the next line after processing all segments of the current audio file
+
+    if sink is not None:
+        sink.close()
+        print(f"\nShards saved to {OUTPUT_DIR}")
 
     # Save metadata.csv
     try:
-        with open(METADATA_PATH, 'w', encoding='utf-8') as meta_file:
-            for entry in metadata_entries:
-                meta_file.write(entry + "\n")
+        os.replace(metadata_tmp_path, METADATA_PATH)
         print(f"\nMetadata saved to {METADATA_PATH}")
         create_training_and_validation_files(METADATA_PATH)
     except Exception as e:
@@ -14,17 +14,15 @@ def combine_text(data):
       Original: [ (text="A"), (text="B"), (text="C") ]
       Combined: [ (text="A B"), (text="B C"), (text="C") ]
     """
-    combined_data = []
-
     # Combine adjacent segments
-    for i in range(len(data) - 1):
-        new_text = data[i]['text'] + " " + data[i + 1]['text']
-        new = {
-            "text": new_text,
-            "start": data[i]['start'],
-            "duration": data[i]['duration']
+    combined_data = [
+        {
+            "text": current['text'] + " " + following['text'],
+            "start": current['start'],
+            "duration": current['duration']
         }
-        combined_data.append(new)
+        for current, following in zip(data, data[1:])
+    ]
 
     # Add the last segment as-is
     last = {
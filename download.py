@@ -1,5 +1,8 @@
 import os
 import json
+import queue
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 from youtube_transcript_api import YouTubeTranscriptApi
 import yt_dlp
 
@@ -26,10 +29,7 @@ def download_transcript(video_id, output_path, speaker_name, language='en'):
         print(f"Failed to download transcript for {speaker_name}: {e}")
         return False
 
-def download_audio(video_id, output_path, speaker_name, ffmpeg_path=None):
-    audio_folder = os.path.join(output_path, 'audios')
-    os.makedirs(audio_folder, exist_ok=True)
-
+def _create_youtube_dl(ffmpeg_path=None):
     ydl_opts = {
         'format': 'bestaudio/best',
         'postprocessors': [{
@@ -37,14 +37,22 @@ def download_audio(video_id, output_path, speaker_name, ffmpeg_path=None):
             'preferredcodec': 'mp3',
             'preferredquality': '192',
         }],
-        'outtmpl': os.path.join(audio_folder, f"{speaker_name}.%(ext)s"),
+        'concurrent_fragment_downloads': 4,  # Download fragments of a video in parallel
     }
 
     if ffmpeg_path:
         ydl_opts['ffmpeg_location'] = ffmpeg_path
 
+    return yt_dlp.YoutubeDL(ydl_opts)
+
+def download_audio(video_id, output_path, speaker_name, ffmpeg_path=None, ydl=None):
+    audio_folder = os.path.join(output_path, 'audios')
+    os.makedirs(audio_folder, exist_ok=True)
+
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # A ydl passed in is reused across downloads and closed by the caller
+        with contextlib.nullcontext(ydl) if ydl is not None else _create_youtube_dl(ffmpeg_path) as ydl:
+            ydl.params['outtmpl'] = {'default': os.path.join(audio_folder, f"{speaker_name}.%(ext)s")}
             ydl.download([f"https://youtu.be/{video_id}"])
         print(f"Audio downloaded successfully for {speaker_name}.")
         return True
@@ -52,22 +60,52 @@ def download_audio(video_id, output_path, speaker_name, ffmpeg_path=None):
         print(f"Failed to download audio for {speaker_name}: {e}")
         return False
 
-def process_video_links(input_file, output_path, language='en', ffmpeg_path=None, start = 100):
+def _download_audio_with_shared_ydl(youtube_dls, video_id, output_path, speaker_name):
+    # 'outtmpl' is changed per video, so a YoutubeDL is only used by one download at a time
+    ydl = youtube_dls.get()
+    try:
+        return download_audio(video_id, output_path, speaker_name, ydl=ydl)
+    finally:
+        youtube_dls.put(ydl)
+
+def process_video_links(input_file, output_path, language='en', ffmpeg_path=None, start = 100, max_workers=8):
     with open(input_file, 'r', encoding='utf-8') as file:
         video_urls = [line.strip() for line in file.readlines() if line.strip()]
 
-    for index, video_url in enumerate(video_urls, start=start):
-        video_id = video_url.split('v=')[-1].split('&')[0] if 'v=' in video_url else video_url.split('/')[-1].split('?')[0]
-        speaker_name = f"speaker_{index + 1}"
-        print(f"Processing {speaker_name} with video ID: {video_id}")
+    # YoutubeDL is expensive to build (extractors, postprocessors), so one
+    # instance per worker thread is reused across all downloads
+    youtube_dls = queue.Queue()
+    for _ in range(min(max_workers, len(video_urls))):
+        youtube_dls.put(_create_youtube_dl(ffmpeg_path))
 
-        transcript_success = download_transcript(video_id, output_path, speaker_name, language=language)
-        audio_success = download_audio(video_id, output_path, speaker_name, ffmpeg_path=ffmpeg_path)
-
-        if transcript_success and audio_success:
-            print(f"Successfully processed {speaker_name}.\n")
-        else:
-            print(f"Failed to process {speaker_name}.\n")
+    # Downloads are network bound, so transcripts and audios of several videos run in parallel
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            jobs = []
+            for index, video_url in enumerate(video_urls, start=start):
+                video_id = video_url.split('v=')[-1].split('&')[0] if 'v=' in video_url else video_url.split('/')[-1].split('?')[0]
+                speaker_name = f"speaker_{index + 1}"
+                print(f"Processing {speaker_name} with video ID: {video_id}")
+
+                transcript_future = executor.submit(download_transcript, video_id, output_path, speaker_name, language=language)
+                audio_future = executor.submit(_download_audio_with_shared_ydl, youtube_dls, video_id, output_path, speaker_name)
+                jobs.append((speaker_name, transcript_future, audio_future))
+
+            for speaker_name, transcript_future, audio_future in jobs:
+                transcript_success = transcript_future.result()
+                audio_success = audio_future.result()
+
+                if transcript_success and audio_success:
+                    print(f"Successfully processed {speaker_name}.\n")
+                else:
+                    print(f"Failed to process {speaker_name}.\n")
+    finally:
+        # Same cleanup the "with yt_dlp.YoutubeDL(...)" block does (saves cookies, closes request handlers)
+        while not youtube_dls.empty():
+            try:
+                youtube_dls.get().close()
+            except Exception as e:
+                print(f"Failed to close yt-dlp: {e}")
 
 if __name__ == "__main__":
     input_file = "links\links.txt"
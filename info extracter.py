@@ -1,39 +1,66 @@
 import os
-import json
+from concurrent.futures import ThreadPoolExecutor
 from collections import Counter
 import string
 from pathlib import Path
+import numpy as np
+import orjson
 
 # to run this files first open cmd and run
-# pip install numpy pandas librosa youtube_transcript_api yt-dlp
+# pip install numpy pandas librosa orjson youtube_transcript_api yt-dlp
 
-def process_json_files(folder_path, output_file):
+def _scan_one(file_path):
+    """
+    Reads a single transcript JSON file.
+
+    Returns (duration, durations, texts) for the file, or None if the file
+    could not be processed.
+    """
+    try:
+        with open(file_path, 'rb') as json_file:
+            data = orjson.loads(json_file.read())
+        if not isinstance(data, list):
+            print(f"Unexpected format in file: {file_path}")
+            return None
+        
+        duration = data[-1]['start'] + data[-1]['duration']
+        durations = [item['duration'] for item in data]
+        texts = [item['text'] for item in data if 'text' in item]
+        
+        return duration, durations, texts
+    
+    except (orjson.JSONDecodeError, Exception) as e:
+        print(f"Error processing {file_path}: {e}")
+        return None
+
+def process_json_files(folder_path, output_file, max_workers=32):
     duration = 0
-    total_lines = 0
     max_duration = float('-inf')
     min_duration = float('inf')
     
+    durations = []
     texts = []
     
-    for file_path in Path(folder_path).glob('*.json'):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as json_file:
-                data = json.load(json_file)
-                if not isinstance(data, list):
-                    print(f"Unexpected format in file: {file_path}")
-                    continue
-                
-                duration += data[-1]['start'] + data[-1]['duration']
-                
-                for item in data:
-                    max_duration = max(max_duration, item['duration'])
-                    min_duration = min(min_duration, item['duration'])
-                    if 'text' in item:
-                        texts.append(item['text'])
-                        total_lines += 1
-                        
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"Error processing {file_path}: {e}")
+    # Reading the files is I/O bound, so they are scanned on a thread pool.
+    # map() keeps the results in file order.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(_scan_one, Path(folder_path).glob('*.json'))
+        
+        for result in results:
+            if result is None:
+                continue
+            file_duration, file_durations, file_texts = result
+            duration += file_duration
+            durations.extend(file_durations)
+            texts.extend(file_texts)
+    
+    # Single vectorized pass instead of a max()/min() call per segment
+    if durations:
+        all_durations = np.fromiter(durations, dtype=np.float64, count=len(durations))
+        max_duration = float(all_durations.max())
+        min_duration = float(all_durations.min())
+    
+    total_lines = len(texts)
     
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write('\n'.join(texts))
@@ -41,20 +68,22 @@ def process_json_files(folder_path, output_file):
     return duration, total_lines, max_duration, min_duration
 
 def analyze_words(file_path, table_file):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        text = f.read()
-    
     translator = str.maketrans('', '', string.punctuation)
-    text = text.translate(translator)
+    word_counts = Counter()
+    total_words = 0
     
-    words = text.lower().split()
-    word_counts = Counter(words)
+    # Stream line by line so memory stays proportional to the vocabulary, not the file size
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            words = line.translate(translator).lower().split()
+            word_counts.update(words)
+            total_words += len(words)
     
     with open(table_file, 'w', encoding='utf-8') as f:
         for word, count in word_counts.most_common():
             f.write(f"{word}: {count}\n")
     
-    return len(words), len(word_counts)
+    return total_words, len(word_counts)
     
     
 def format_duration(total_seconds):